@@ -1,10 +1,43 @@
 import tkinter as tk
 from tkinter import scrolledtext, messagebox, ttk
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
+import logging
 import threading
-import time
 import os
+import http.client
+from urllib.parse import urlparse
+
+# Prefer orjson for parsing API responses; its JSONDecodeError subclasses
+# json.JSONDecodeError, so error handling is the same either way
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+logger = logging.getLogger(__name__)
+
+# Backend used when no valid API URL is configured
+_DEFAULT_API_URL = "http://127.0.0.1:5000"
+
+# Shared HTTP session so health checks and queries reuse keep-alive connections;
+# main.py uses it for its API status check too
+SESSION = requests.Session()
+SESSION.headers.update({"Connection": "keep-alive"})
+SESSION.mount("http://", HTTPAdapter(
+    pool_connections=2,
+    pool_maxsize=4,
+    max_retries=Retry(total=1, backoff_factor=0.2)
+))
+
+# How long the connection probe waits for /health once connected
+_HEALTH_READ_TIMEOUT = 5  # seconds
+
+# Typing indicator animation frames
+_DOTS = ("", ".", "..", "...")
 
 class QueryAssistantApp:
     def __init__(self, root):
@@ -30,17 +63,54 @@ class QueryAssistantApp:
         # State variables
         self.is_connected = False
         self.is_sending = False
-        self.connection_check_thread = None
+        
+        # Chat text waiting to be written by the next idle flush
+        self._pending = []
+        self._flush_id = None
+        
+        # Typing animation state
+        self.typing_dots = None
+        self.typing_animation_id = None
+        self._last_dots = ""
         
         # UI Components
         self.create_widgets()
         
         # Start connection check
-        self.start_connection_checker()
+        self._probe_thread = None
+        self._schedule_probe()
     
     def get_api_url(self):
         """Get API URL from environment or use default"""
-        return os.environ.get("API_URL", "http://127.0.0.1:5000")
+        return os.environ.get("API_URL", _DEFAULT_API_URL)
+    
+    @property
+    def api_url(self):
+        return self._api_url
+    
+    @api_url.setter
+    def api_url(self, url):
+        """Store the API URL and parse its host/port once for the connection probe
+        
+        An unparsable URL is logged and ignored, keeping the previous URL (or
+        the default one if none was set yet); callers can compare api_url
+        with what they assigned to detect this.
+        """
+        parsed = urlparse(url)
+        try:
+            port = parsed.port
+        except ValueError as e:
+            logger.error(f"Invalid API URL {url!r}: {e}")
+            if not hasattr(self, "_api_url"):
+                self.api_url = _DEFAULT_API_URL
+            return
+        
+        self._api_url = url
+        self._api_host = parsed.hostname or "127.0.0.1"
+        self._api_port = port or (443 if parsed.scheme == "https" else 80)
+        self._api_path = parsed.path.rstrip("/")
+        self._api_conn_class = (http.client.HTTPSConnection if parsed.scheme == "https"
+                                else http.client.HTTPConnection)
     
     def create_widgets(self):
         # Main frame using grid layout
@@ -143,53 +213,60 @@ class QueryAssistantApp:
         self.add_system_message("Welcome to the AI Student Query Assistant!")
         self.add_system_message("Type your question and press Enter or click Send.")
     
-    def start_connection_checker(self):
-        """Start a thread to periodically check backend connection"""
-        if self.connection_check_thread is None or not self.connection_check_thread.is_alive():
-            self.connection_check_thread = threading.Thread(target=self.check_connection_periodically)
-            self.connection_check_thread.daemon = True
-            self.connection_check_thread.start()
-    
-    def check_connection_periodically(self):
-        """Check connection every 30 seconds"""
-        while True:
-            self.check_connection()
-            time.sleep(30)
+    def _schedule_probe(self):
+        """Check the backend connection now and again every 30 seconds"""
+        self.root.after(30000, self._schedule_probe)
+        
+        # Each probe runs on a short-lived thread; skip this round if the
+        # previous probe is still waiting on a slow server
+        if self._probe_thread is None or not self._probe_thread.is_alive():
+            self._probe_thread = threading.Thread(target=self._probe_worker, daemon=True)
+            self._probe_thread.start()
     
-    def check_connection(self):
-        """Check if backend API is available"""
+    def _probe_worker(self):
+        """Check if backend API is up and reports itself healthy"""
+        # A bare GET on http.client is enough here; requests' session and
+        # retry machinery is kept for the real /query calls
+        conn = self._api_conn_class(self._api_host, self._api_port, timeout=0.5)
         try:
-            # Try a health check endpoint
-            health_url = f"{self.api_url}/health"
-            response = requests.get(health_url, timeout=3)
-            
-            if response.status_code == 200:
-                self.is_connected = True
-                self.root.after(0, self.update_connection_indicator, True)
-            else:
-                self.is_connected = False
-                self.root.after(0, self.update_connection_indicator, False)
-        except:
-            # If the health endpoint doesn't exist, try the query endpoint
+            # A refused or timed out connect means the server is down
             try:
-                response = requests.post(
-                    f"{self.api_url}/query", 
-                    json={"question": "test"}, 
-                    timeout=3
-                )
-                self.is_connected = True
-                self.root.after(0, self.update_connection_indicator, True)
-            except:
+                conn.connect()
+            except OSError:
                 self.is_connected = False
                 self.root.after(0, self.update_connection_indicator, False)
+                return
+            
+            # The server is listening, so ask it whether it is healthy. Never
+            # fall back to /query here, as that would call Gemini on every probe.
+            # The connect timeout is kept short, but a server whose threads are
+            # all busy with model calls gets longer to answer.
+            conn.sock.settimeout(_HEALTH_READ_TIMEOUT)
+            try:
+                conn.request("GET", f"{self._api_path}/health")
+                healthy = conn.getresponse().status == 200
+            except (OSError, http.client.HTTPException):
+                healthy = False
+        finally:
+            conn.close()
+        
+        # A reachable server still accepts queries, even while it reports
+        # itself unhealthy
+        self.is_connected = True
+        self.root.after(0, self.update_connection_indicator, healthy, True)
     
-    def update_connection_indicator(self, is_connected):
+    def update_connection_indicator(self, is_connected, server_up=False):
         """Update the connection indicator in the UI thread"""
         if is_connected:
             self.connection_indicator.config(
                 text="✅ Connected",
                 foreground=self.colors["success"]
             )
+        elif server_up:
+            self.connection_indicator.config(
+                text="⚠️ Server Unhealthy",
+                foreground=self.colors["warning"]
+            )
         else:
             self.connection_indicator.config(
                 text="❌ Not Connected",
@@ -203,13 +280,39 @@ class QueryAssistantApp:
     
     def add_system_message(self, message):
         """Add a system message to the chat"""
+        self._pending.append((f"System: {message}\n\n", "system"))
+        self._schedule_flush()
+    
+    def _schedule_flush(self):
+        """Schedule pending chat text to be written when Tk is idle"""
+        if self._flush_id is None:
+            self._flush_id = self.root.after_idle(self._flush)
+    
+    def _flush(self):
+        """Write all pending chat text in a single widget update"""
+        if self._flush_id is not None:
+            self.root.after_cancel(self._flush_id)
+            self._flush_id = None
+        
+        if not self._pending:
+            return
+        
+        args = []
+        for text, tag in self._pending:
+            args.extend((text, tag))
+        self._pending.clear()
+        
         self.text_area.config(state=tk.NORMAL)
-        self.text_area.insert(tk.END, f"System: {message}\n\n", "system")
+        self.text_area.insert(tk.END, *args)
         self.text_area.see(tk.END)
         self.text_area.config(state=tk.DISABLED)
         
-    def get_response(self):
-        """Get response from API for the current query"""
+    def get_response(self, on_answer=None):
+        """Get response from API for the current query
+        
+        on_answer, if given, is called on the Tk thread with the answer text
+        once the server has answered successfully.
+        """
         query = self.entry.get().strip()
         if not query:
             messagebox.showinfo("Info", "Please enter a question")
@@ -230,9 +333,9 @@ class QueryAssistantApp:
         self.entry.config(state=tk.DISABLED)
         
         # Start a thread to handle the API call
-        threading.Thread(target=self.send_request, args=(query,), daemon=True).start()
+        threading.Thread(target=self.send_request, args=(query, on_answer), daemon=True).start()
     
-    def send_request(self, query):
+    def send_request(self, query, on_answer=None):
         """Send request to API in a separate thread"""
         try:
             # Add user message to chat first
@@ -243,7 +346,7 @@ class QueryAssistantApp:
             
             # Make API request
             try:
-                response = requests.post(
+                response = SESSION.post(
                     f"{self.api_url}/query", 
                     json={"question": query},
                     timeout=30  # 30 second timeout
@@ -261,12 +364,14 @@ class QueryAssistantApp:
             
             # Process and display response
             if response.status_code == 200:
-                answer = response.json().get("answer", "No response")
+                answer = _json_loads(response.content).get("answer", "No response")
                 self.root.after(0, self.add_assistant_message, answer)
+                if on_answer:
+                    self.root.after(0, on_answer, answer)
             else:
                 # Try to get the error message from the response if available
                 try:
-                    error_detail = response.json().get("error", "Unknown error")
+                    error_detail = _json_loads(response.content).get("error", "Unknown error")
                     error_msg = f"Error: {error_detail} (Status code: {response.status_code})"
                 except:
                     error_msg = f"Error: Server returned status code {response.status_code}"
@@ -290,85 +395,76 @@ class QueryAssistantApp:
     
     def add_user_message(self, message):
         """Add user message to the chat"""
-        self.text_area.config(state=tk.NORMAL)
-        self.text_area.insert(tk.END, f"You: {message}\n", "user")
-        self.text_area.see(tk.END)
-        self.text_area.config(state=tk.DISABLED)
+        self._pending.append((f"You: {message}\n", "user"))
+        self._schedule_flush()
     
     def add_typing_indicator(self):
         """Add typing indicator to the chat"""
+        # Write queued messages first so the indicator lands after them
+        self._flush()
+        
         self.text_area.config(state=tk.NORMAL)
+        # Left-gravity marks stay put when text is inserted at them, so they
+        # keep pointing at the start of the indicator and of its dots
+        self.text_area.mark_set("typing_anchor", "end-1c")
+        self.text_area.mark_gravity("typing_anchor", tk.LEFT)
         self.text_area.insert(tk.END, "Assistant: Typing", "assistant")
+        self.text_area.mark_set("typing_dots_anchor", "end-1c")
+        self.text_area.mark_gravity("typing_dots_anchor", tk.LEFT)
         self.text_area.see(tk.END)
         self.text_area.config(state=tk.DISABLED)
         self.typing_dots = 0
+        self._last_dots = ""
         self.update_typing_indicator()
     
+    def _typing_indicator_shown(self):
+        """Check whether the typing indicator marks are in the chat"""
+        return "typing_anchor" in self.text_area.mark_names()
+    
     def update_typing_indicator(self):
         """Update the typing animation"""
-        if not hasattr(self, "typing_animation_id"):
-            self.typing_animation_id = None
-            
         if self.typing_animation_id:
             self.root.after_cancel(self.typing_animation_id)
             self.typing_animation_id = None
             
-        if hasattr(self, "typing_dots") and self.typing_dots is not None:
-            self.text_area.config(state=tk.NORMAL)
-            
-            # Find last "Assistant: Typing" line and update dots
-            content = self.text_area.get("1.0", tk.END)
-            last_typing_pos = content.rfind("Assistant: Typing")
-            
-            if last_typing_pos >= 0:
-                # Calculate position in the text widget
-                line_count = content[:last_typing_pos].count('\n') + 1
-                char_pos = len("Assistant: Typing") + (self.typing_dots if self.typing_dots <= 3 else 0)
-                
-                # Delete old dots if any
-                if self.typing_dots > 0:
-                    start_pos = f"{line_count}.{len('Assistant: Typing')}"
-                    end_pos = f"{line_count}.{len('Assistant: Typing') + 3}"
-                    self.text_area.delete(start_pos, end_pos)
+        if self.typing_dots is not None and self._typing_indicator_shown():
+            # Only touch the widget when the frame actually changes
+            dots = _DOTS[self.typing_dots & 3]
+            if dots != self._last_dots:
+                self.text_area.config(state=tk.NORMAL)
                 
-                # Add new dots
-                dots = "." * ((self.typing_dots % 4) + 1)
-                self.text_area.insert(f"{line_count}.{len('Assistant: Typing')}", dots)
+                # Replace the old dots in place
+                self.text_area.delete("typing_dots_anchor", "typing_dots_anchor lineend")
+                self.text_area.insert("typing_dots_anchor", dots, "assistant")
                 
-                self.typing_dots += 1
-                self.typing_animation_id = self.root.after(300, self.update_typing_indicator)
+                self.text_area.config(state=tk.DISABLED)
+                self._last_dots = dots
             
-            self.text_area.config(state=tk.DISABLED)
+            self.typing_dots += 1
+            self.typing_animation_id = self.root.after(300, self.update_typing_indicator)
     
     def remove_typing_indicator(self):
         """Remove typing indicator"""
-        if hasattr(self, "typing_animation_id") and self.typing_animation_id:
+        if self.typing_animation_id:
             self.root.after_cancel(self.typing_animation_id)
             self.typing_animation_id = None
             
         self.typing_dots = None
-        content = self.text_area.get("1.0", tk.END)
-        last_typing_pos = content.rfind("Assistant: Typing")
         
-        if last_typing_pos >= 0:
+        if self._typing_indicator_shown():
             self.text_area.config(state=tk.NORMAL)
             
-            # Find and delete the typing indicator line
-            line_count = content[:last_typing_pos].count('\n') + 1
-            start_pos = f"{line_count}.0"
-            end_pos = f"{line_count + 1}.0"
-            self.text_area.delete(start_pos, end_pos)
+            # Delete the typing indicator line
+            self.text_area.delete("typing_anchor", "typing_anchor lineend +1c")
+            self.text_area.mark_unset("typing_anchor", "typing_dots_anchor")
             
             self.text_area.config(state=tk.DISABLED)
     
     def add_assistant_message(self, message, is_error=False):
         """Add assistant message to the chat"""
-        self.text_area.config(state=tk.NORMAL)
-        
         tag = "error" if is_error else "assistant"
-        self.text_area.insert(tk.END, f"Assistant: {message}\n\n", tag)
-        self.text_area.see(tk.END)
-        self.text_area.config(state=tk.DISABLED)
+        self._pending.append((f"Assistant: {message}\n\n", tag))
+        self._schedule_flush()
     
     def reset_ui_state(self):
         """Reset UI state after request completes"""
@@ -381,6 +477,8 @@ class QueryAssistantApp:
     
     def clear_chat(self):
         """Clear the chat history"""
+        self._pending.clear()
+        self.remove_typing_indicator()
         self.text_area.config(state=tk.NORMAL)
         self.text_area.delete(1.0, tk.END)
         self.text_area.config(state=tk.DISABLED)
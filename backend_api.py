@@ -1,10 +1,16 @@
 import os
 import logging
+import random
 import time
+import threading
+from collections import OrderedDict
 from functools import wraps
+from hashlib import blake2b
 import google.generativeai as genai
 from flask import Flask, request, jsonify
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
+from waitress import serve
 
 # Configure logging
 logging.basicConfig(
@@ -20,8 +26,17 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+# Reject oversized bodies before they are read and parsed. Questions are
+# capped at 500 characters, so this leaves room for multi-byte UTF-8.
+app.config["MAX_CONTENT_LENGTH"] = 4096
+
 # Initialize rate limiting
-rate_limits = {}
+# Maps hash(client_ip) -> (count, window_start), least recently seen first
+_RL = OrderedDict()
+_RL_LOCK = threading.Lock()
+_RL_MAX = 10000  # Max number of tracked clients
+_RL_SWEEP_EVERY = 1024  # Requests between sweeps for expired windows
+_rl_requests = 0
 RATE_LIMIT_WINDOW = 60  # seconds
 MAX_REQUESTS_PER_WINDOW = 10
 
@@ -29,7 +44,29 @@ MAX_REQUESTS_PER_WINDOW = 10
 API_KEY = os.environ.get("GEMINI_API_KEY")
 if not API_KEY:
     logger.warning("No GEMINI_API_KEY found in environment variables")
-genai.configure(api_key=API_KEY)
+# Use the gRPC transport explicitly: its channel is pooled and shared by
+# every model below, so cache misses don't pay for a new TLS handshake.
+# The channel must not be shared across forked workers; with a pre-forking
+# server (e.g. gunicorn --preload), call genai.configure() again in each
+# worker after the fork.
+genai.configure(api_key=API_KEY, transport="grpc")
+
+# Build the Gemini models once, in order of preference
+MODEL_NAMES = ["gemini-1.5-pro", "gemini-pro"]
+_MODELS = []
+for _model_name in MODEL_NAMES:
+    try:
+        _MODELS.append(genai.GenerativeModel(_model_name))
+    except Exception as e:
+        logger.error(f"Could not initialize model {_model_name}: {e}")
+
+MAX_ATTEMPTS = 3  # Passes over the model list before falling back
+
+# Context prepended to every question
+_PROMPT_PREFIX = (
+    "You are a helpful assistant for university students.\n"
+    "Answer the following question concisely and accurately:\n\n"
+)
 
 # Define fallback responses
 FALLBACK_RESPONSES = [
@@ -40,29 +77,53 @@ FALLBACK_RESPONSES = [
     "I'm currently experiencing high demand. Please try your question again in a moment."
 ]
 
-# Cache for storing recent responses to save API calls
-response_cache = {}
+# Bounded LRU cache of recent responses to save API calls.
+# Keys are 16-byte digests of the normalized question so key size stays fixed.
+_CACHE = OrderedDict()
+_CACHE_MAX = 1024
+_CACHE_LOCK = threading.Lock()
 CACHE_TTL = 3600  # 1 hour in seconds
 
 def rate_limiter(f):
     """Rate limiting decorator"""
     @wraps(f)
     def wrapper(*args, **kwargs):
+        global _rl_requests
         client_ip = request.remote_addr
         current_time = time.time()
         
-        # Initialize or update rate limit data for this IP
-        if client_ip not in rate_limits:
-            rate_limits[client_ip] = {'count': 0, 'window_start': current_time}
-        elif current_time - rate_limits[client_ip]['window_start'] >= RATE_LIMIT_WINDOW:
-            # Reset if window has passed
-            rate_limits[client_ip] = {'count': 0, 'window_start': current_time}
+        key = hash(client_ip)
         
-        # Increment request count
-        rate_limits[client_ip]['count'] += 1
+        with _RL_LOCK:
+            _rl_requests += 1
+            
+            # Periodically drop clients whose window expired long ago. Entries
+            # are ordered by last request, so once an entry's window is still
+            # open every later client was seen more recently and can be skipped.
+            if _rl_requests % _RL_SWEEP_EVERY == 0:
+                stale = []
+                for k, (_, start) in _RL.items():
+                    if current_time - start < RATE_LIMIT_WINDOW:
+                        break
+                    if current_time - start > 2 * RATE_LIMIT_WINDOW:
+                        stale.append(k)
+                for k in stale:
+                    del _RL[k]
+            
+            # Start a new window for unknown clients or if the window has passed
+            entry = _RL.get(key)
+            if entry is None or current_time - entry[1] >= RATE_LIMIT_WINDOW:
+                count, window_start = 1, current_time
+            else:
+                count, window_start = entry[0] + 1, entry[1]
+            
+            _RL[key] = (count, window_start)
+            _RL.move_to_end(key)
+            while len(_RL) > _RL_MAX:
+                _RL.popitem(last=False)
         
         # Check if rate limit exceeded
-        if rate_limits[client_ip]['count'] > MAX_REQUESTS_PER_WINDOW:
+        if count > MAX_REQUESTS_PER_WINDOW:
             logger.warning(f"Rate limit exceeded for IP: {client_ip}")
             return jsonify({
                 "answer": "You've sent too many requests. Please wait a moment before trying again.",
@@ -72,72 +133,62 @@ def rate_limiter(f):
         return f(*args, **kwargs)
     return wrapper
 
-def get_ai_response(question, retry_count=0):
+def _cache_key(question):
+    """Return the fixed-size cache key for a question"""
+    return blake2b(question.lower().strip().encode(), digest_size=16).digest()
+
+def _cache_lookup(question):
+    """Return a cached answer for the question if one is still fresh"""
+    key = _cache_key(question)
+    now = time.time()
+    with _CACHE_LOCK:
+        entry = _CACHE.get(key)
+        if entry and now - entry[1] < CACHE_TTL:
+            _CACHE.move_to_end(key)
+            return entry[0]
+    return None
+
+def _cache_store(question, answer):
+    """Cache an answer, evicting the least recently used entries"""
+    key = _cache_key(question)
+    now = time.time()
+    with _CACHE_LOCK:
+        _CACHE[key] = (answer, now)
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > _CACHE_MAX:
+            _CACHE.popitem(last=False)
+
+def get_ai_response(question):
     """Get AI response using Google Gemini API with retries and fallbacks"""
-    # Check cache first
-    cache_key = question.lower().strip()
-    if cache_key in response_cache:
-        cache_entry = response_cache[cache_key]
-        if time.time() - cache_entry['timestamp'] < CACHE_TTL:
-            logger.info(f"Cache hit for question: {question[:50]}...")
-            return cache_entry['response']
+    prompt = _PROMPT_PREFIX + question
     
-    try:
-        # Add context to the question
-        prompt = f"""
-        You are a helpful assistant for university students.
-        Answer the following question concisely and accurately:
-        
-        {question}
-        """
-        
-        # Try multiple models in order of preference
-        models_to_try = ["gemini-1.5-pro", "gemini-pro"]
-        
-        for model_name in models_to_try:
+    for attempt in range(MAX_ATTEMPTS):
+        # Try each model in order of preference
+        for model in _MODELS:
             try:
-                model = genai.GenerativeModel(model_name)
                 response = model.generate_content(prompt)
                 
                 if hasattr(response, "text"):
                     answer = response.text.strip()
-                    
-                    # Cache the response
-                    response_cache[cache_key] = {
-                        'response': answer,
-                        'timestamp': time.time()
-                    }
-                    
+                    _cache_store(question, answer)
                     return answer
             except Exception as model_error:
-                logger.warning(f"Error with model {model_name}: {model_error}")
-                continue  # Try next model
+                logger.warning(f"Error with model {model.model_name}: {model_error}")
         
-        # If we've exhausted retries or all models failed
-        if retry_count < 2:
-            # Wait briefly and retry
-            time.sleep(1)
-            return get_ai_response(question, retry_count + 1)
-        else:
-            # Return a fallback response if all retries and models failed
-            import random
-            return random.choice(FALLBACK_RESPONSES)
-
-    except Exception as e:
-        logger.error(f"Google API Error: {e}")
-        if retry_count < 2:
-            # Wait longer for quota issues
-            time.sleep(2)
-            return get_ai_response(question, retry_count + 1)
-        else:
-            import random
-            return random.choice(FALLBACK_RESPONSES)
+        # All models failed, back off before the next attempt
+        if attempt < MAX_ATTEMPTS - 1:
+            time.sleep(0.5 * (2 ** attempt))
+    
+    # Return a fallback response if all attempts and models failed
+    logger.error(f"All models failed after {MAX_ATTEMPTS} attempts")
+    return random.choice(FALLBACK_RESPONSES)
 
 @app.route("/query", methods=["POST"])
 @rate_limiter
 def query():
     try:
-        data = request.get_json()
+        # Malformed JSON or invalid UTF-8 yields None instead of raising
+        data = request.get_json(silent=True, cache=False)
         
         if not data:
             logger.warning("No JSON data in request")
@@ -157,6 +208,15 @@ def query():
             logger.warning(f"Question too long: {len(question)} characters")
             return jsonify({"error": "Question too long (max 500 characters)", "answer": "Your question is too long. Please keep it under 500 characters."}), 400
         
+        # Answer repeated questions straight from the cache
+        cached_answer = _cache_lookup(question)
+        if cached_answer is not None:
+            logger.info(f"Cache hit for question: {question[:50]}...")
+            return jsonify({
+                "answer": cached_answer,
+                "source": "cache"
+            })
+        
         # Generate AI response
         try:
             logger.info(f"Generating AI response for: {question[:50]}...")
@@ -177,6 +237,9 @@ def query():
                 "error": str(e)
             }), 200  # Return 200 so the frontend still shows the error message
         
+    except HTTPException:
+        # Let Flask route errors like 413 to their handlers
+        raise
     except Exception as e:
         logger.error(f"Unexpected error in query endpoint: {e}")
         return jsonify({
@@ -193,6 +256,14 @@ def health_check():
 def not_found(e):
     return jsonify({"error": "Endpoint not found"}), 404
 
+@app.errorhandler(413)
+def payload_too_large(e):
+    logger.warning(f"Rejected request body over {app.config['MAX_CONTENT_LENGTH']} bytes")
+    return jsonify({
+        "error": "Payload too large",
+        "answer": "Your question is too long. Please keep it under 500 characters."
+    }), 413
+
 @app.errorhandler(500)
 def server_error(e):
     logger.error(f"Server error: {e}")
@@ -202,4 +273,5 @@ if __name__ == "__main__":
     logger.info("Starting AI Student Query Assistant API")
     # Use environment variable for port if available
     port = int(os.environ.get("PORT", 5000))
-    app.run(host="0.0.0.0", port=port, debug=False)  # Set debug=False in production
\ No newline at end of file
+    # Serve with a threaded WSGI server so one slow Gemini call doesn't block other users
+    serve(app, host="0.0.0.0", port=port, threads=8)
\ No newline at end of file
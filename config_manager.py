@@ -1,24 +1,115 @@
 import os
+import sys
+import copy
 import json
-import tkinter as tk
-from tkinter import ttk, messagebox
-import keyring
-from dotenv import load_dotenv
+import threading
+import time
+from contextlib import contextmanager
+
+# tkinter, keyring and dotenv are imported where they are used, so headless
+# use of ConfigManager does not pay for loading them
+
+# Prefer orjson for reading and writing the config file
+try:
+    import orjson
+    
+    def _loads(data):
+        return orjson.loads(data)
+    
+    def _dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
+except ImportError:
+    def _loads(data):
+        return json.loads(data)
+    
+    def _dumps(obj):
+        return (json.dumps(obj, indent=2) + "\n").encode()
+
+# How long an API key read from the keyring is reused
+_API_KEY_TTL = 300  # seconds
+
+_keyring_module = None
+
+def _keyring():
+    """Import keyring on first use, pinned to the platform's native backend"""
+    global _keyring_module
+    if _keyring_module is None:
+        import keyring
+        
+        # Skip backend auto-detection unless the user chose a backend, either
+        # in the environment or in keyring's config file
+        if not os.environ.get("PYTHON_KEYRING_BACKEND"):
+            try:
+                from keyring import core
+                
+                if core.load_config() is None:
+                    backend = None
+                    if sys.platform == "darwin":
+                        from keyring.backends import macOS
+                        backend = macOS.Keyring
+                    elif sys.platform == "win32":
+                        from keyring.backends import Windows
+                        backend = Windows.WinVaultKeyring
+                    elif sys.platform.startswith("linux"):
+                        from keyring.backends import SecretService
+                        backend = SecretService.Keyring
+                    
+                    # priority raises when the backend cannot work here
+                    if backend is not None and backend.priority > 0:
+                        keyring.set_keyring(backend())
+            except Exception:
+                # Backend unavailable here, leave keyring's own choice in place
+                pass
+        
+        _keyring_module = keyring
+    return _keyring_module
+
+# Default configuration, copied whenever a fresh config is needed
+_DEFAULT_CONFIG = {
+    "api": {
+        "url": "http://127.0.0.1:5000",
+        "timeout": 30
+    },
+    "ui": {
+        "theme": "light",
+        "font_size": 12,
+        "window_size": "600x700"
+    },
+    "database": {
+        "enabled": True,
+        "path": "qa_database.db"
+    }
+}
 
 class ConfigManager:
     def __init__(self, config_file="config.json"):
         self.config_file = config_file
+        
+        # Bytes last read from or written to the config file, to skip no-op saves
+        self._last_written_bytes = None
         self.config = self.load_config()
         
+        # Memoized get() results, invalidated on set, and API keys as (key, expires_at)
+        self._cache = {}
+        self._api_key_cache = {}
+        
+        # Writes deferred while inside batch()
+        self._batch_depth = 0
+        self._dirty = False
+        
         # Load environment variables
+        from dotenv import load_dotenv
         load_dotenv()
     
     def load_config(self):
         """Load configuration from file or create default"""
         if os.path.exists(self.config_file):
             try:
-                with open(self.config_file, 'r') as f:
-                    return json.load(f)
+                with open(self.config_file, 'rb') as f:
+                    data = f.read()
+                config = _loads(data)
+                self._last_written_bytes = data
+                return config
             except Exception:
                 return self.get_default_config()
         else:
@@ -26,27 +117,28 @@ class ConfigManager:
     
     def get_default_config(self):
         """Return default configuration"""
-        return {
-            "api": {
-                "url": "http://127.0.0.1:5000",
-                "timeout": 30
-            },
-            "ui": {
-                "theme": "light",
-                "font_size": 12,
-                "window_size": "600x700"
-            },
-            "database": {
-                "enabled": True,
-                "path": "qa_database.db"
-            }
-        }
+        return copy.deepcopy(_DEFAULT_CONFIG)
     
     def save_config(self):
         """Save configuration to file"""
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(self.config, f, indent=4)
+            data = _dumps(self.config)
+            
+            # Nothing changed since the file was last read or written
+            if data == self._last_written_bytes:
+                self._dirty = False
+                return True
+            
+            # Write a temporary file and swap it in, so the config is never left half-written
+            tmp_file = self.config_file + ".tmp"
+            with open(tmp_file, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.config_file)
+            
+            self._last_written_bytes = data
+            self._dirty = False
             return True
         except Exception as e:
             print(f"Error saving config: {e}")
@@ -54,26 +146,74 @@ class ConfigManager:
     
     def get(self, section, key=None):
         """Get configuration value(s)"""
+        cache_key = (section, key)
+        try:
+            return self._cache[cache_key]
+        except KeyError:
+            pass
+        
         if key is None:
-            return self.config.get(section, {})
-        return self.config.get(section, {}).get(key)
+            value = self.config.get(section, {})
+        else:
+            value = self.config.get(section, {}).get(key)
+        self._cache[cache_key] = value
+        return value
     
     def set(self, section, key, value):
         """Set configuration value"""
         if section not in self.config:
             self.config[section] = {}
         self.config[section][key] = value
+        self._cache.pop((section, key), None)
+        self._cache.pop((section, None), None)
+        return self._save_or_defer()
+    
+    def update(self, updates, save=True):
+        """Set several values at once, given as {section: {key: value}}, with a single write"""
+        for section, values in updates.items():
+            self.config.setdefault(section, {}).update(values)
+            for key in values:
+                self._cache.pop((section, key), None)
+            self._cache.pop((section, None), None)
+        
+        if not save:
+            self._dirty = True
+            return True
+        return self._save_or_defer()
+    
+    @contextmanager
+    def batch(self):
+        """Defer config file writes until the outermost batch exits"""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0 and self._dirty:
+                self.save_config()
+    
+    def _save_or_defer(self):
+        """Save now, or mark the config dirty if inside a batch"""
+        if self._batch_depth:
+            self._dirty = True
+            return True
         return self.save_config()
     
     def get_api_key(self, service_name="gemini_api"):
         """Get API key from keyring"""
+        cached = self._api_key_cache.get(service_name)
+        if cached and cached[1] > time.monotonic():
+            return cached[0]
+        
         try:
-            api_key = keyring.get_password(service_name, "api_key")
+            api_key = _keyring().get_password(service_name, "api_key")
             
             # If not in keyring, try environment variables
             if not api_key:
                 api_key = os.environ.get("GEMINI_API_KEY")
             
+            if api_key:
+                self._api_key_cache[service_name] = (api_key, time.monotonic() + _API_KEY_TTL)
             return api_key
         except Exception:
             return None
@@ -81,13 +221,16 @@ class ConfigManager:
     def set_api_key(self, api_key, service_name="gemini_api"):
         """Store API key in keyring"""
         try:
-            keyring.set_password(service_name, "api_key", api_key)
+            _keyring().set_password(service_name, "api_key", api_key)
+            self._api_key_cache[service_name] = (api_key, time.monotonic() + _API_KEY_TTL)
             return True
         except Exception:
             return False
 
 class ConfigDialog:
     def __init__(self, parent, config_manager):
+        import tkinter as tk
+        
         self.parent = parent
         self.config_manager = config_manager
         
@@ -106,14 +249,59 @@ class ConfigDialog:
         self.create_widgets()
     
     def create_widgets(self):
+        import tkinter as tk
+        from tkinter import ttk
+        
         # Create notebook for tabs
         self.notebook = ttk.Notebook(self.dialog)
         self.notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
-        # API settings tab
+        # Tabs start empty and are filled in the first time they are shown
         self.api_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.api_frame, text="API Settings")
         
+        self.ui_frame = ttk.Frame(self.notebook)
+        self.notebook.add(self.ui_frame, text="UI Settings")
+        
+        self.db_frame = ttk.Frame(self.notebook)
+        self.notebook.add(self.db_frame, text="Database")
+        
+        self._tab_builders = {
+            str(self.api_frame): self.build_api_tab,
+            str(self.ui_frame): self.build_ui_tab,
+            str(self.db_frame): self.build_db_tab
+        }
+        self.notebook.bind("<<NotebookTabChanged>>", self._ensure_tab_built)
+        self._ensure_tab_built()
+        
+        # Buttons at the bottom
+        button_frame = ttk.Frame(self.dialog)
+        button_frame.pack(fill=tk.X, padx=10, pady=10)
+        
+        ttk.Button(button_frame, text="Cancel", command=self.dialog.destroy).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="Save", command=self.save_settings).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(button_frame, text="Reset to Defaults", command=self.reset_to_defaults).pack(side=tk.LEFT, padx=5)
+    
+    def _ensure_tab_built(self, event=None):
+        """Build the selected tab's widgets if it has not been shown before"""
+        builder = self._tab_builders.pop(self.notebook.select(), None)
+        if builder:
+            builder()
+    
+    def _build_all_tabs(self):
+        """Build every tab that has not been shown yet"""
+        for builder in list(self._tab_builders.values()):
+            builder()
+        self._tab_builders.clear()
+    
+    def _is_built(self, frame):
+        """Return True if the tab's widgets and variables exist"""
+        return str(frame) not in self._tab_builders
+    
+    def build_api_tab(self):
+        import tkinter as tk
+        from tkinter import ttk
+        
         ttk.Label(self.api_frame, text="API URL:").grid(row=0, column=0, sticky="w", padx=10, pady=(15, 5))
         
         self.api_url_var = tk.StringVar(value=self.config_manager.get("api", "url"))
@@ -131,9 +319,11 @@ class ConfigDialog:
         
         ttk.Label(self.api_frame, text="Google Gemini API Key:").grid(row=3, column=0, sticky="w", padx=10, pady=5)
         
-        self.api_key_var = tk.StringVar(value=self.config_manager.get_api_key() or "")
+        # The keyring can take a while to answer, so the key is filled in once it has been read
+        self.api_key_var = tk.StringVar(value="")
         self.api_key_entry = ttk.Entry(self.api_frame, textvariable=self.api_key_var, width=40, show="*")
         self.api_key_entry.grid(row=3, column=1, sticky="we", padx=10, pady=5)
+        threading.Thread(target=self._load_api_key_async, daemon=True).start()
         
         self.show_key_var = tk.BooleanVar(value=False)
         self.show_key_check = ttk.Checkbutton(
@@ -143,10 +333,28 @@ class ConfigDialog:
             command=self.toggle_api_key_visibility
         )
         self.show_key_check.grid(row=4, column=1, sticky="w", padx=10, pady=5)
+    
+    def _load_api_key_async(self):
+        """Read the API key off the UI thread and hand it to the dialog"""
+        import tkinter as tk
         
-        # UI settings tab
-        self.ui_frame = ttk.Frame(self.notebook)
-        self.notebook.add(self.ui_frame, text="UI Settings")
+        api_key = self.config_manager.get_api_key()
+        if not api_key:
+            return
+        try:
+            self.dialog.after(0, self._show_api_key, api_key)
+        except (RuntimeError, tk.TclError):
+            # The dialog was closed before the keyring answered
+            pass
+    
+    def _show_api_key(self, api_key):
+        """Fill in the API key unless the user has already typed one"""
+        if not self.api_key_var.get():
+            self.api_key_var.set(api_key)
+    
+    def build_ui_tab(self):
+        import tkinter as tk
+        from tkinter import ttk
         
         ttk.Label(self.ui_frame, text="Theme:").grid(row=0, column=0, sticky="w", padx=10, pady=(15, 5))
         
@@ -159,10 +367,10 @@ class ConfigDialog:
         self.font_size_var = tk.IntVar(value=self.config_manager.get("ui", "font_size"))
         self.font_size_spinbox = ttk.Spinbox(self.ui_frame, from_=8, to=24, textvariable=self.font_size_var, width=5)
         self.font_size_spinbox.grid(row=1, column=1, sticky="w", padx=10, pady=5)
-        
-        # Database settings tab
-        self.db_frame = ttk.Frame(self.notebook)
-        self.notebook.add(self.db_frame, text="Database")
+    
+    def build_db_tab(self):
+        import tkinter as tk
+        from tkinter import ttk
         
         self.db_enabled_var = tk.BooleanVar(value=self.config_manager.get("database", "enabled"))
         self.db_enabled_check = ttk.Checkbutton(
@@ -177,14 +385,6 @@ class ConfigDialog:
         self.db_path_var = tk.StringVar(value=self.config_manager.get("database", "path"))
         self.db_path_entry = ttk.Entry(self.db_frame, textvariable=self.db_path_var, width=40)
         self.db_path_entry.grid(row=1, column=1, sticky="we", padx=10, pady=5)
-        
-        # Buttons at the bottom
-        button_frame = ttk.Frame(self.dialog)
-        button_frame.pack(fill=tk.X, padx=10, pady=10)
-        
-        ttk.Button(button_frame, text="Cancel", command=self.dialog.destroy).pack(side=tk.RIGHT, padx=5)
-        ttk.Button(button_frame, text="Save", command=self.save_settings).pack(side=tk.RIGHT, padx=5)
-        ttk.Button(button_frame, text="Reset to Defaults", command=self.reset_to_defaults).pack(side=tk.LEFT, padx=5)
     
     def toggle_api_key_visibility(self):
         """Toggle API key visibility"""
@@ -195,28 +395,48 @@ class ConfigDialog:
     
     def save_settings(self):
         """Save all settings"""
-        # Save API settings
-        self.config_manager.set("api", "url", self.api_url_var.get())
-        self.config_manager.set("api", "timeout", self.api_timeout_var.get())
+        from tkinter import messagebox
+        
+        # Tabs that were never shown still hold the saved values
+        updates = {}
+        
+        if self._is_built(self.api_frame):
+            # Save API key
+            if self.api_key_var.get():
+                self.config_manager.set_api_key(self.api_key_var.get())
+            
+            updates["api"] = {
+                "url": self.api_url_var.get(),
+                "timeout": self.api_timeout_var.get()
+            }
         
-        # Save API key
-        if self.api_key_var.get():
-            self.config_manager.set_api_key(self.api_key_var.get())
+        if self._is_built(self.ui_frame):
+            updates["ui"] = {
+                "theme": self.theme_var.get(),
+                "font_size": self.font_size_var.get()
+            }
         
-        # Save UI settings
-        self.config_manager.set("ui", "theme", self.theme_var.get())
-        self.config_manager.set("ui", "font_size", self.font_size_var.get())
+        if self._is_built(self.db_frame):
+            updates["database"] = {
+                "enabled": self.db_enabled_var.get(),
+                "path": self.db_path_var.get()
+            }
         
-        # Save database settings
-        self.config_manager.set("database", "enabled", self.db_enabled_var.get())
-        self.config_manager.set("database", "path", self.db_path_var.get())
+        # Save API, UI and database settings with a single file write
+        if updates:
+            self.config_manager.update(updates)
         
         messagebox.showinfo("Settings", "Settings saved successfully")
         self.dialog.destroy()
     
     def reset_to_defaults(self):
         """Reset all settings to defaults"""
+        from tkinter import messagebox
+        
         if messagebox.askyesno("Reset Settings", "Are you sure you want to reset all settings to defaults?"):
+            # Every tab needs its variables to show the defaults
+            self._build_all_tabs()
+            
             # Get default config
             default_config = self.config_manager.get_default_config()
             
@@ -2,19 +2,190 @@ import sqlite3
 import time
 import logging
 import os
+import queue
 import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from urllib.request import pathname2url
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Writer thread batching: max pairs per transaction, and how long to wait for more
+_WRITE_BATCH_MAX = 64
+_WRITE_BATCH_WAIT = 0.05  # seconds
+
+# Incremental cleanup run by the writer thread: after this many cached pairs,
+# delete up to _TRIM_BATCH rows older than _MAX_AGE_DAYS or beyond _MAX_ENTRIES
+_TRIM_EVERY_WRITES = 100
+_TRIM_BATCH = 50
+_MAX_AGE_DAYS = 30
+_MAX_ENTRIES = 1000
+
+# Most read-only connections open at once for lookups and stats
+_READER_POOL_SIZE = 4
+
+# Number of recent answers kept in memory in front of sqlite
+_MEM_CACHE_MAX = 512
+
+# How long get_stats reuses the database file size
+_SIZE_CACHE_TTL = 5  # seconds
+
+# Access statistics of a row are bumped at most once per interval, so hot
+# questions are served by reads instead of a write per hit
+_TOUCH_INTERVAL = 60  # seconds
+
+# The qa_cache schema needs generated columns (sqlite 3.31). RETURNING (3.35)
+# is used when available; older versions look the upserted id up instead.
+_MIN_SQLITE_VERSION = (3, 31, 0)
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Columns of qa_cache. q_norm is computed by sqlite, and lookups apply the
+# same lower(trim(?)) to their parameter so both sides normalize identically.
+_QA_CACHE_COLUMNS = '''
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    created_at INTEGER NOT NULL,
+    last_accessed INTEGER NOT NULL,
+    access_count INTEGER DEFAULT 1,
+    q_norm TEXT GENERATED ALWAYS AS (lower(trim(question))) STORED
+'''
+
+# Statements run on every request are kept as constants so the
+# connection's statement cache always finds them already prepared
+
+# Exact lookup of the normalized question
+_SQL_GET_EXACT = '''
+SELECT id, answer, last_accessed FROM qa_cache
+WHERE q_norm = lower(trim(?))
+'''
+
+# Best full-text match for an FTS5 query
+_SQL_GET_FUZZY = '''
+SELECT qa_cache.id, qa_cache.answer, qa_cache.last_accessed FROM qa_fts
+JOIN qa_cache ON qa_cache.id = qa_fts.rowid
+WHERE qa_fts MATCH ?
+ORDER BY bm25(qa_fts)
+LIMIT 1
+'''
+
+# Bump the access statistics of a row
+_SQL_TOUCH_BY_ID = '''
+UPDATE qa_cache
+SET last_accessed = ?, access_count = access_count + 1
+WHERE id = ? AND last_accessed < ?
+'''
+
+# Bump the access statistics of a question served from memory
+_SQL_TOUCH_BY_NORM = '''
+UPDATE qa_cache
+SET last_accessed = ?, access_count = access_count + 1
+WHERE q_norm = lower(trim(?)) AND last_accessed < ?
+'''
+
+# Insert, or refresh the existing row for the same normalized question
+_SQL_UPSERT = '''
+INSERT INTO qa_cache (question, answer, created_at, last_accessed)
+VALUES (?, ?, ?, ?)
+ON CONFLICT(q_norm) DO UPDATE SET
+answer = excluded.answer,
+last_accessed = excluded.last_accessed,
+access_count = access_count + 1
+''' + ('RETURNING id\n' if _HAS_RETURNING else '')
+
+# Id of the row an upsert wrote, for sqlite without RETURNING
+_SQL_GET_ID = "SELECT id FROM qa_cache WHERE q_norm = lower(trim(?))"
+
+_SQL_COUNT = "SELECT COUNT(*) as count, MAX(id) as max_id FROM qa_cache"
+
+# Cleanup in one pass: rows past the age cutoff, plus the least used rows when
+# the table is over max_entries (enough to go below it with a buffer of 100)
+_SQL_CLEANUP = '''
+DELETE FROM qa_cache WHERE id IN (
+    SELECT id FROM (
+        SELECT id, last_accessed,
+            ROW_NUMBER() OVER (ORDER BY access_count ASC, last_accessed ASC) AS rn,
+            COUNT(*) OVER () AS cnt
+        FROM qa_cache
+    )
+    WHERE last_accessed < :cutoff OR (cnt > :max AND rn <= cnt - :max + 100)
+)
+'''
+
+# Incremental cleanup, a bounded number of rows at a time. The ids are
+# selected first so the in-memory cache can drop the same rows.
+_SQL_TRIM_OLD = '''
+SELECT id FROM qa_cache
+WHERE last_accessed < ?
+ORDER BY last_accessed
+LIMIT ?
+'''
+
+_SQL_TRIM_LEAST_USED = '''
+SELECT id FROM qa_cache
+ORDER BY access_count ASC, last_accessed ASC
+LIMIT ?
+'''
+
+_SQL_DELETE_BY_ID = "DELETE FROM qa_cache WHERE id = ?"
+
+# Statistics: the five most popular and the five most recently used questions
+_SQL_STATS = '''
+SELECT 'popular' AS kind, question, access_count AS value FROM (
+    SELECT question, access_count FROM qa_cache
+    ORDER BY access_count DESC
+    LIMIT 5
+)
+UNION ALL
+SELECT 'recent' AS kind, question, last_accessed AS value FROM (
+    SELECT question, last_accessed FROM qa_cache
+    ORDER BY last_accessed DESC
+    LIMIT 5
+)
+'''
+
 class DatabaseManager:
     """Manages the database operations for caching questions and answers"""
     
     def __init__(self, db_path="qa_database.db"):
+        if sqlite3.sqlite_version_info < _MIN_SQLITE_VERSION:
+            raise RuntimeError(
+                f"The answer cache needs SQLite {'.'.join(map(str, _MIN_SQLITE_VERSION))} or newer, "
+                f"but Python is using SQLite {sqlite3.sqlite_version}; caching is disabled"
+            )
+        
         self.db_path = db_path
-        self.connection = None
-        self.connection_lock = threading.Lock()
+        # A single read-write connection for schema setup, the writer thread and cleanup,
+        # and a pool of read-only connections for lookups; WAL lets them read concurrently
+        self._write_conn = None
+        self._write_lock = threading.Lock()
+        self._reader_pool = queue.LifoQueue()
+        self._reader_count = 0
+        self._reader_lock = threading.Lock()
+        self.fts_enabled = False
+        
+        # Row count kept up to date by the writer and cleanup instead of COUNT(*) per stats call.
+        # AUTOINCREMENT ids only grow, so an upsert returning an id above _max_id inserted a row.
+        self._approx_count = 0
+        self._max_id = 0
+        self._count_lock = threading.Lock()
+        self._size_cache = (0.0, float('-inf'))
+        
         self.initialize_db()
+        
+        # Recent exact and fuzzy answers by cleaned question, as
+        # (answer, row id or None, last access time), least recently used first
+        self._mem_cache = OrderedDict()
+        self._mem_lock = threading.Lock()
+        
+        # Cache writes are queued as (sql, params) and committed in batches by one writer thread.
+        # The first batch after startup trims, so short sessions still expire old rows.
+        self._writes_since_trim = _TRIM_EVERY_WRITES
+        self._write_q = queue.Queue()
+        self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer.start()
     
     def initialize_db(self):
         """Initialize the database structure"""
@@ -24,32 +195,40 @@ class DatabaseManager:
             if db_dir and not os.path.exists(db_dir):
                 os.makedirs(db_dir)
             
-            # Connect to database
-            with self.get_connection() as conn:
+            # Connect to database. Connections run in autocommit mode, so the
+            # schema setup and migrations are wrapped in one explicit transaction.
+            # Write transactions start IMMEDIATE so they wait for the write lock
+            # up front instead of failing when a read has to be upgraded.
+            with self._write_lock, self._writer_connection() as conn:
                 cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                
+                # Older databases lack the generated normalized question column
+                migrated = self._migrate_q_norm(cursor)
                 
                 # Create tables
+                cursor.execute(f"CREATE TABLE IF NOT EXISTS qa_cache ({_QA_CACHE_COLUMNS})")
+                
+                # Create indexes
                 cursor.execute('''
-                CREATE TABLE IF NOT EXISTS qa_cache (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    question TEXT NOT NULL,
-                    answer TEXT NOT NULL,
-                    created_at INTEGER NOT NULL,
-                    last_accessed INTEGER NOT NULL,
-                    access_count INTEGER DEFAULT 1
-                )
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_q_norm ON qa_cache(q_norm)
                 ''')
                 
-                # Create indexes
                 cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_question ON qa_cache(question)
+                DROP INDEX IF EXISTS idx_question
                 ''')
                 
                 cursor.execute('''
                 CREATE INDEX IF NOT EXISTS idx_last_accessed ON qa_cache(last_accessed)
                 ''')
                 
-                conn.commit()
+                # Full-text index over questions for fuzzy matching
+                self.fts_enabled = self._create_fts(cursor, rebuild=migrated)
+                
+                cursor.execute(_SQL_COUNT)
+                row = cursor.fetchone()
+                self._approx_count = row['count']
+                self._max_id = row['max_id'] or 0
             
             logger.info(f"Database initialized at {self.db_path}")
             return True
@@ -57,87 +236,215 @@ class DatabaseManager:
             logger.error(f"Database initialization error: {e}")
             return False
     
-    def get_connection(self):
-        """Get a connection to the database with thread safety"""
-        with self.connection_lock:
-            if self.connection is None:
-                self.connection = sqlite3.connect(self.db_path)
-                # Configure connection
-                self.connection.row_factory = sqlite3.Row
-            return self.connection
+    def _migrate_q_norm(self, cursor):
+        """Rebuild qa_cache from before q_norm was a generated column, returning True if it ran"""
+        # hidden is 3 for a stored generated column; an empty result means there is no table yet
+        cursor.execute("PRAGMA table_xinfo(qa_cache)")
+        columns = {row['name']: row['hidden'] for row in cursor.fetchall()}
+        if not columns or columns.get('q_norm') == 3:
+            return False
+        
+        # A generated STORED column cannot be added with ALTER TABLE, so copy into a new table,
+        # keeping only the most used row per normalized question for the unique index
+        cursor.execute(f"CREATE TABLE qa_cache_new ({_QA_CACHE_COLUMNS})")
+        cursor.execute('''
+        INSERT INTO qa_cache_new (id, question, answer, created_at, last_accessed, access_count)
+        SELECT id, question, answer, created_at, last_accessed, access_count FROM (
+            SELECT *, ROW_NUMBER() OVER (
+                PARTITION BY lower(trim(question)) ORDER BY access_count DESC, last_accessed DESC
+            ) AS rn
+            FROM qa_cache
+        )
+        WHERE rn = 1
+        ''')
+        
+        # Dropping the old table also drops its indexes and triggers, which are recreated after this
+        cursor.execute("DROP TABLE qa_cache")
+        cursor.execute("ALTER TABLE qa_cache_new RENAME TO qa_cache")
+        logger.info("Migrated qa_cache to a generated normalized question column")
+        return True
+    
+    def _create_fts(self, cursor, rebuild=False):
+        """Create the FTS5 index over qa_cache questions and the triggers that keep it in sync"""
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'qa_fts'")
+        exists = cursor.fetchone() is not None
+        
+        try:
+            cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS qa_fts
+            USING fts5(question, content='qa_cache', content_rowid='id')
+            ''')
+        except sqlite3.OperationalError as e:
+            logger.warning(f"FTS5 unavailable, fuzzy matching disabled: {e}")
+            return False
+        
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS qa_fts_insert AFTER INSERT ON qa_cache BEGIN
+            INSERT INTO qa_fts(rowid, question) VALUES (new.id, new.question);
+        END
+        ''')
+        
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS qa_fts_delete AFTER DELETE ON qa_cache BEGIN
+            INSERT INTO qa_fts(qa_fts, rowid, question) VALUES ('delete', old.id, old.question);
+        END
+        ''')
+        
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS qa_fts_update AFTER UPDATE OF question ON qa_cache BEGIN
+            INSERT INTO qa_fts(qa_fts, rowid, question) VALUES ('delete', old.id, old.question);
+            INSERT INTO qa_fts(rowid, question) VALUES (new.id, new.question);
+        END
+        ''')
+        
+        # Index rows that were cached before the FTS table existed, or copied by a migration
+        if rebuild or not exists:
+            cursor.execute("INSERT INTO qa_fts(qa_fts) VALUES ('rebuild')")
+        
+        return True
+    
+    def _fts_query(self, words):
+        """Build an FTS5 query matching the first two or the last two words"""
+        # Quote each word so punctuation and FTS keywords are taken literally
+        quoted = ['"' + word.replace('"', '""') + '"' for word in words]
+        return f"({quoted[0]} {quoted[1]}) OR ({quoted[-2]} {quoted[-1]})"
+    
+    def _connect(self, database, **kwargs):
+        """Open a configured connection to the database"""
+        # isolation_level=None is autocommit: each statement is its own
+        # transaction, so no connection holds a lock between calls.
+        # check_same_thread=False because connections are shared between threads.
+        conn = sqlite3.connect(
+            database, isolation_level=None, check_same_thread=False, cached_statements=256, **kwargs
+        )
+        conn.row_factory = sqlite3.Row
+        return conn
+    
+    def _writer_connection(self):
+        """Get the read-write connection, opening it on first use; callers hold _write_lock"""
+        if self._write_conn is None:
+            self._write_conn = self._connect(self.db_path)
+            # Lets the incremental cleanup return freed pages to the filesystem. Only
+            # takes effect on a new database, so it must come before the WAL switch
+            # (which writes the database header) and before the first table.
+            self._write_conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            # WAL lets readers proceed during writes and needs fewer fsyncs;
+            # NORMAL sync is safe in WAL mode (only the last commit can be lost)
+            self._write_conn.execute("PRAGMA journal_mode=WAL")
+            self._write_conn.execute("PRAGMA synchronous=NORMAL")
+            self._configure_connection(self._write_conn)
+        return self._write_conn
+    
+    @contextmanager
+    def _reader(self):
+        """Borrow a read-only connection from the pool, opening one if the pool is not full"""
+        try:
+            conn = self._reader_pool.get_nowait()
+        except queue.Empty:
+            with self._reader_lock:
+                can_open = self._reader_count < _READER_POOL_SIZE
+                if can_open:
+                    self._reader_count += 1
+            if can_open:
+                try:
+                    uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+                    conn = self._connect(uri, uri=True)
+                    self._configure_connection(conn)
+                except Exception:
+                    with self._reader_lock:
+                        self._reader_count -= 1
+                    raise
+            else:
+                conn = self._reader_pool.get()
+        try:
+            yield conn
+        finally:
+            self._reader_pool.put(conn)
+    
+    def _configure_connection(self, conn):
+        """Tune the connection for many small cache transactions"""
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")  # 256 MB
+        conn.execute("PRAGMA cache_size=-20000")  # ~20 MB
+        conn.execute("PRAGMA busy_timeout=5000")  # wait for another writer instead of failing
     
     def close(self):
-        """Close the database connection"""
-        with self.connection_lock:
-            if self.connection:
-                self.connection.close()
-                self.connection = None
+        """Flush queued writes and close all database connections"""
+        if self._writer.is_alive():
+            self._write_q.put(None)
+            self._writer.join()
+        
+        with self._write_lock:
+            if self._write_conn is not None:
+                self._write_conn.close()
+                self._write_conn = None
+        
+        # Readers still borrowed by another thread are closed when garbage collected
+        with self._reader_lock:
+            while True:
+                try:
+                    self._reader_pool.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._reader_count = 0
     
     def get_cached_answer(self, question):
         """Get a cached answer for a question if it exists"""
+        # Clean the question for the in-memory cache and fuzzy matching;
+        # sqlite normalizes the question itself for exact lookups
+        cleaned_question = question.strip().lower()
+        
+        now = int(time.time())
+        touch_before = now - _TOUCH_INTERVAL
+        
+        # Recently seen questions are answered without touching sqlite; the
+        # writer thread bumps the access statistics at most once per interval
+        touch = False
+        with self._mem_lock:
+            entry = self._mem_cache.get(cleaned_question)
+            if entry is not None:
+                self._mem_cache.move_to_end(cleaned_question)
+                answer, row_id, touched_at = entry
+                if touched_at < touch_before:
+                    touch = True
+                    self._mem_cache[cleaned_question] = (answer, row_id, now)
+        if entry is not None:
+            if touch:
+                if row_id is None:
+                    self._write_q.put((_SQL_TOUCH_BY_NORM, (now, question, touch_before)))
+                else:
+                    self._write_q.put((_SQL_TOUCH_BY_ID, (now, row_id, touch_before)))
+            logger.info(f"Memory cache hit for question: {question[:50]}...")
+            return answer
+        
         try:
-            with self.get_connection() as conn:
+            with self._reader() as conn:
                 cursor = conn.cursor()
                 
-                # Clean the question for better matching
-                cleaned_question = question.strip().lower()
-                
                 # Try exact match first
-                cursor.execute('''
-                SELECT answer, access_count FROM qa_cache 
-                WHERE LOWER(question) = ? 
-                ORDER BY last_accessed DESC LIMIT 1
-                ''', (cleaned_question,))
+                cursor.execute(_SQL_GET_EXACT, (question,))
                 
                 result = cursor.fetchone()
                 
                 if result:
-                    # Update the access statistics
-                    answer, access_count = result['answer'], result['access_count']
-                    
-                    cursor.execute('''
-                    UPDATE qa_cache 
-                    SET last_accessed = ?, access_count = ? 
-                    WHERE LOWER(question) = ?
-                    ''', (int(time.time()), access_count + 1, cleaned_question))
-                    
-                    conn.commit()
-                    
+                    touched_at = self._touch(result, now)
+                    self._remember(cleaned_question, result['answer'], result['id'], touched_at)
                     logger.info(f"Cache hit for question: {question[:50]}...")
-                    return answer
+                    return result['answer']
                 
-                # If no exact match, try fuzzy matching (simplified)
-                # In a production application, consider using full-text search or other methods
-                words = cleaned_question.split()
-                if len(words) > 3:  # Only try fuzzy matching for longer questions
-                    placeholders = ', '.join(['?'] * len(words))
-                    query = f'''
-                    SELECT answer, question, access_count FROM qa_cache 
-                    WHERE question LIKE ? OR question LIKE ?
-                    ORDER BY access_count DESC
-                    LIMIT 5
-                    '''
-                    
-                    # Try to match questions that contain key words from the query
-                    cursor.execute(query, (f"%{words[0]}%{words[1]}%", f"%{words[-2]}%{words[-1]}%"))
+                # If no exact match, try a full-text match on the key words
+                words = [w for w in cleaned_question.split() if any(c.isalnum() for c in w)]
+                if self.fts_enabled and len(words) > 3:  # Only try fuzzy matching for longer questions
+                    cursor.execute(_SQL_GET_FUZZY, (self._fts_query(words),))
                     
-                    fuzzy_results = cursor.fetchall()
-                    if fuzzy_results:
-                        # Implement better fuzzy matching if needed
-                        # For now, just return the most accessed result
-                        best_match = max(fuzzy_results, key=lambda x: x['access_count'])
-                        
+                    best_match = cursor.fetchone()
+                    if best_match:
                         logger.info(f"Fuzzy cache hit for question: {question[:50]}...")
                         
                         # Update access statistics for this answer
-                        cursor.execute('''
-                        UPDATE qa_cache 
-                        SET last_accessed = ?, access_count = ? 
-                        WHERE question = ?
-                        ''', (int(time.time()), best_match['access_count'] + 1, best_match['question']))
-                        
-                        conn.commit()
+                        touched_at = self._touch(best_match, now)
                         
+                        self._remember(cleaned_question, best_match['answer'], best_match['id'], touched_at)
                         return best_match['answer']
                 
                 return None
@@ -146,80 +453,153 @@ class DatabaseManager:
             logger.error(f"Error retrieving from cache: {e}")
             return None
     
+    def _touch(self, row, now):
+        """Queue an access statistics bump for a row read from sqlite, unless it had one recently
+        
+        Returns the row's last access time once the bump is applied.
+        """
+        touch_before = now - _TOUCH_INTERVAL
+        if row['last_accessed'] < touch_before:
+            self._write_q.put((_SQL_TOUCH_BY_ID, (now, row['id'], touch_before)))
+            return now
+        return row['last_accessed']
+    
     def cache_qa_pair(self, question, answer):
-        """Cache a question-answer pair"""
+        """Queue a question-answer pair to be cached by the writer thread"""
+        current_time = int(time.time())
+        self._remember(question.strip().lower(), answer, None, current_time)
+        
+        self._write_q.put((_SQL_UPSERT, (question, answer, current_time, current_time)))
+        logger.info(f"Cached Q&A: {question[:50]}...")
+        return True
+    
+    def _remember(self, cleaned_question, answer, row_id, touched_at):
+        """Keep an answer in the in-memory cache, evicting the least recently used"""
+        with self._mem_lock:
+            self._mem_cache[cleaned_question] = (answer, row_id, touched_at)
+            self._mem_cache.move_to_end(cleaned_question)
+            while len(self._mem_cache) > _MEM_CACHE_MAX:
+                self._mem_cache.popitem(last=False)
+    
+    def _writer_loop(self):
+        """Commit queued cache writes until close() sends None"""
+        while True:
+            item = self._write_q.get()
+            if item is None:
+                return
+            
+            # Collect whatever else arrives shortly after into the same transaction
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + _WRITE_BATCH_WAIT
+            while len(batch) < _WRITE_BATCH_MAX:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._write_q.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            
+            self._write_batch(batch)
+            if stop:
+                return
+    
+    def _write_batch(self, batch):
+        """Run a batch of queued cache writes in one transaction"""
         try:
-            with self.get_connection() as conn:
+            with self._write_lock, self._writer_connection() as conn:
                 cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                # Counters change only once the transaction has committed; a
+                # rolled back batch also rolls back the AUTOINCREMENT sequence
+                inserted = 0
+                max_id = self._max_id
+                writes_since_trim = self._writes_since_trim
+                for sql, params in batch:
+                    cursor.execute(sql, params)
+                    if sql is _SQL_UPSERT:
+                        if not _HAS_RETURNING:
+                            cursor.execute(_SQL_GET_ID, (params[0],))
+                        row_id = cursor.fetchone()['id']
+                        if row_id > max_id:
+                            max_id = row_id
+                            inserted += 1
+                        writes_since_trim += 1
                 
-                current_time = int(time.time())
-                
-                # Check if question already exists
-                cursor.execute('''
-                SELECT id FROM qa_cache WHERE LOWER(question) = ?
-                ''', (question.strip().lower(),))
-                
-                existing = cursor.fetchone()
-                
-                if existing:
-                    # Update existing record
-                    cursor.execute('''
-                    UPDATE qa_cache SET 
-                    answer = ?, 
-                    last_accessed = ?, 
-                    access_count = access_count + 1
-                    WHERE id = ?
-                    ''', (answer, current_time, existing['id']))
-                else:
-                    # Insert new record
-                    cursor.execute('''
-                    INSERT INTO qa_cache (question, answer, created_at, last_accessed)
-                    VALUES (?, ?, ?, ?)
-                    ''', (question, answer, current_time, current_time))
-                
-                conn.commit()
-                logger.info(f"Cached Q&A: {question[:50]}...")
-                return True
-                
+                # Keep the cache bounded a little at a time instead of in one large sweep
+                deleted_ids = set()
+                if writes_since_trim >= _TRIM_EVERY_WRITES:
+                    writes_since_trim = 0
+                    deleted_ids = self._trim(cursor, inserted)
+            
+            self._max_id = max_id
+            self._writes_since_trim = writes_since_trim
+            with self._count_lock:
+                self._approx_count += inserted - len(deleted_ids)
+            
+            # Stop answering trimmed rows from memory. Entries without a row id
+            # may belong to one of them too; they are reloaded from sqlite on
+            # their next lookup.
+            if deleted_ids:
+                with self._mem_lock:
+                    for key, (_, row_id, _) in list(self._mem_cache.items()):
+                        if row_id is None or row_id in deleted_ids:
+                            del self._mem_cache[key]
         except Exception as e:
             logger.error(f"Error caching Q&A: {e}")
-            return False
+    
+    def _trim(self, cursor, inserted):
+        """Delete a bounded batch of expired or excess rows inside the writer's transaction
+        
+        Returns the set of deleted row ids.
+        """
+        cutoff_time = int(time.time()) - (_MAX_AGE_DAYS * 86400)
+        cursor.execute(_SQL_TRIM_OLD, (cutoff_time, _TRIM_BATCH))
+        deleted_ids = {row['id'] for row in cursor.fetchall()}
+        cursor.executemany(_SQL_DELETE_BY_ID, [(row_id,) for row_id in deleted_ids])
+        
+        with self._count_lock:
+            excess = self._approx_count + inserted - len(deleted_ids) - _MAX_ENTRIES
+        if excess > 0:
+            cursor.execute(_SQL_TRIM_LEAST_USED, (min(excess, _TRIM_BATCH),))
+            least_used = {row['id'] for row in cursor.fetchall()}
+            cursor.executemany(_SQL_DELETE_BY_ID, [(row_id,) for row_id in least_used])
+            deleted_ids |= least_used
+        
+        # Each step of the pragma frees pages, so run it to completion
+        cursor.execute("PRAGMA incremental_vacuum(64)").fetchall()
+        
+        if deleted_ids:
+            logger.info(f"Trimmed {len(deleted_ids)} old or least accessed cache entries")
+        return deleted_ids
     
     def clean_old_entries(self, max_age_days=30, max_entries=1000):
         """Clean old entries from the cache"""
+        # Rows may be deleted below, so stop answering from memory
+        with self._mem_lock:
+            self._mem_cache.clear()
+        
         try:
-            with self.get_connection() as conn:
+            # Cleanup shares the writer thread's connection, so it queues behind any batch in progress
+            with self._write_lock, self._writer_connection() as conn:
                 cursor = conn.cursor()
                 
-                # Get total count
-                cursor.execute("SELECT COUNT(*) as count FROM qa_cache")
-                total_count = cursor.fetchone()['count']
+                cursor.execute("BEGIN IMMEDIATE")
                 
-                # If under the max, only clean by age
-                if total_count <= max_entries:
-                    cutoff_time = int(time.time()) - (max_age_days * 86400)
-                    cursor.execute('''
-                    DELETE FROM qa_cache 
-                    WHERE last_accessed < ?
-                    ''', (cutoff_time,))
-                    
-                    deleted_count = cursor.rowcount
-                    logger.info(f"Cleaned {deleted_count} old cache entries")
-                else:
-                    # If over max entries, also clean by access count
-                    cursor.execute('''
-                    DELETE FROM qa_cache 
-                    WHERE id IN (
-                        SELECT id FROM qa_cache
-                        ORDER BY access_count ASC, last_accessed ASC
-                        LIMIT ?
-                    )
-                    ''', (total_count - max_entries + 100,))  # Delete enough to go below max with some buffer
-                    
-                    deleted_count = cursor.rowcount
-                    logger.info(f"Cleaned {deleted_count} least accessed cache entries")
+                cutoff_time = int(time.time()) - (max_age_days * 86400)
+                cursor.execute(_SQL_CLEANUP, {'cutoff': cutoff_time, 'max': max_entries})
+                
+                deleted_count = cursor.rowcount
+                logger.info(f"Cleaned {deleted_count} old or least accessed cache entries")
+                
+                with self._count_lock:
+                    self._approx_count = max(self._approx_count - deleted_count, 0)
                 
-                conn.commit()
                 return deleted_count
                 
         except Exception as e:
@@ -229,37 +609,42 @@ class DatabaseManager:
     def get_stats(self):
         """Get database statistics"""
         try:
-            with self.get_connection() as conn:
+            with self._reader() as conn:
                 cursor = conn.cursor()
                 
                 stats = {}
                 
                 # Total entries
-                cursor.execute("SELECT COUNT(*) as count FROM qa_cache")
-                stats['total_entries'] = cursor.fetchone()['count']
+                with self._count_lock:
+                    stats['total_entries'] = self._approx_count
                 
-                # Most popular questions
-                cursor.execute('''
-                SELECT question, access_count FROM qa_cache
-                ORDER BY access_count DESC
-                LIMIT 5
-                ''')
-                stats['popular_questions'] = [dict(row) for row in cursor.fetchall()]
+                stats['popular_questions'] = []
+                stats['recent_questions'] = []
                 
-                # Recently accessed
-                cursor.execute('''
-                SELECT question, datetime(last_accessed, 'unixepoch') as last_access_time 
-                FROM qa_cache
-                ORDER BY last_accessed DESC
-                LIMIT 5
-                ''')
-                stats['recent_questions'] = [dict(row) for row in cursor.fetchall()]
+                # Most popular and recently accessed questions in one query
+                cursor.execute(_SQL_STATS)
+                for row in cursor.fetchall():
+                    if row['kind'] == 'popular':
+                        stats['popular_questions'].append({'question': row['question'], 'access_count': row['value']})
+                    else:
+                        # Formatted here rather than with sqlite's datetime(), same UTC format as before
+                        last_access_time = datetime.fromtimestamp(row['value'], timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+                        stats['recent_questions'].append({'question': row['question'], 'last_access_time': last_access_time})
                 
-                # Database size
-                stats['db_size_mb'] = round(os.path.getsize(self.db_path) / (1024 * 1024), 2)
+                # Database size, which rarely changes between refreshes
+                stats['db_size_mb'] = self._db_size_mb()
                 
                 return stats
                 
         except Exception as e:
             logger.error(f"Error getting database stats: {e}")
-            return {'error': str(e)}
\ No newline at end of file
+            return {'error': str(e)}
+    
+    def _db_size_mb(self):
+        """Return the database file size in MB, re-reading it at most every _SIZE_CACHE_TTL seconds"""
+        size_mb, checked_at = self._size_cache
+        now = time.monotonic()
+        if now - checked_at >= _SIZE_CACHE_TTL:
+            size_mb = round(os.path.getsize(self.db_path) / (1024 * 1024), 2)
+            self._size_cache = (size_mb, now)
+        return size_mb
\ No newline at end of file
@@ -1,34 +1,114 @@
 import tkinter as tk
 from tkinter import messagebox, Menu
 import logging
+import queue
 import threading
 import os
 import sys
 import webbrowser
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from functools import partial
-import requests
+from logging.handlers import QueueHandler, QueueListener
 
 # Import our custom modules
 from config_manager import ConfigManager, ConfigDialog
 from database_manager import DatabaseManager
-from ai_student_query_assistant import QueryAssistantApp
+from ai_student_query_assistant import QueryAssistantApp, SESSION
 
-# Configure logging
+# Configure logging; records are queued on the calling thread and written
+# to the file and console by a background listener, so a log call on the Tk
+# thread never waits on disk I/O
+_log_queue = queue.Queue(-1)
+_log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+_log_handlers = [
+    logging.FileHandler("app.log"),
+    logging.StreamHandler()
+]
+for _handler in _log_handlers:
+    _handler.setFormatter(_log_formatter)
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("app.log"),
-        logging.StreamHandler()
-    ]
+    format='%(message)s',  # the listener's handlers apply the real format
+    handlers=[QueueHandler(_log_queue)]
 )
+_log_listener = QueueListener(_log_queue, *_log_handlers)
+_log_listener.start()
 logger = logging.getLogger(__name__)
 
+# How long the API status check waits on /health before also trying /query
+_HEALTH_GRACE = 1.0  # seconds
+
+# Text of the Help menu dialogs
+_USER_GUIDE_TEXT = """
+        # AI Student Query Assistant - User Guide
+        
+        Welcome to the AI Student Query Assistant! This application helps students get quick answers to their questions.
+        
+        ## Getting Started
+        
+        1. Make sure the backend API is running (python backend_api.py)
+        2. Type your question in the input field
+        3. Press Enter or click Send to get an answer
+        
+        ## Features
+        
+        - **Instant Answers**: Get answers to common student questions
+        - **Database Cache**: Frequently asked questions are cached for faster responses
+        - **Conversation History**: Review your question history within the session
+        
+        ## Tips
+        
+        - Keep questions clear and concise
+        - For best results, ask one question at a time
+        - If the API is not responding, check the backend status
+        
+        ## Troubleshooting
+        
+        - If the application displays "Not Connected", make sure the backend API is running
+        - Check the API status from the Help menu
+        - If you encounter errors, try clearing the conversation
+        
+        ## Settings
+        
+        Access the settings from the File menu to configure:
+        - API connection details
+        - Database cache options
+        - UI preferences
+        
+        ## Support
+        
+        For support or to report issues, please contact the system administrator.
+        """
+
+_ABOUT_TEXT = """
+        AI Student Query Assistant
+        Version 1.0
+        
+        A smart assistant for answering student questions.
+        
+        Features:
+        - AI-powered responses
+        - Database caching for faster replies
+        - User-friendly interface
+        
+        Created with ❤️ for students
+        """
+
 class MainApplication:
     def __init__(self, root):
         self.root = root
         self.root.title("AI Student Query Assistant")
         
+        # Status update scheduled by _post_status but not yet shown
+        self._pending_status = None
+        
+        # API status checks run one at a time on a reused worker thread; the
+        # HTTP probes they make run on their own pool, so a probe still
+        # finishing from an earlier check never delays the next one
+        self._status_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="api-status")
+        self._probe_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="api-probe")
+        self._status_future = None
+        
         # Initialize config manager
         self.config_manager = ConfigManager()
         
@@ -36,12 +116,19 @@ class MainApplication:
         window_size = self.config_manager.get("ui", "window_size")
         self.root.geometry(window_size)
         
-        # Initialize database if enabled
-        if self.config_manager.get("database", "enabled"):
+        # Settings read on every query, refreshed when the settings dialog closes
+        self._db_enabled = bool(self.config_manager.get("database", "enabled"))
+        self._api_url = self.config_manager.get("api", "url")
+        
+        # Initialize database if enabled. It is opened on a background thread so the
+        # window can appear first; _db_ready is set once db_manager is assigned.
+        self.db_manager = None
+        self._db_ready = threading.Event()
+        if self._db_enabled:
             db_path = self.config_manager.get("database", "path")
-            self.db_manager = DatabaseManager(db_path)
+            threading.Thread(target=self._init_db, args=(db_path,), daemon=True).start()
         else:
-            self.db_manager = None
+            self._db_ready.set()
         
         # Create menu bar
         self.create_menu()
@@ -50,15 +137,13 @@ class MainApplication:
         self.app = QueryAssistantApp(self.root)
         
         # Set API URL from config
-        api_url = self.config_manager.get("api", "url")
-        if api_url:
-            self.app.api_url = api_url
+        if self._api_url:
+            self.app.api_url = self._api_url
+            # An invalid URL is ignored by the app; use what it kept
+            self._api_url = self.app.api_url
         
         # Extend the application with additional features
         self.extend_app()
-        
-        # Start periodic tasks
-        self.start_background_tasks()
     
     def create_menu(self):
         """Create the menu bar"""
@@ -71,15 +156,10 @@ class MainApplication:
         file_menu.add_command(label="Exit", command=self.on_exit)
         menubar.add_cascade(label="File", menu=file_menu)
         
-        # Tools menu
-        tools_menu = Menu(menubar, tearoff=0)
-        tools_menu.add_command(label="Clear Conversation", command=self.clear_conversation)
-        
-        if self.db_manager:
-            tools_menu.add_command(label="Database Statistics", command=self.show_db_stats)
-            tools_menu.add_command(label="Clean Database Cache", command=self.clean_database)
-        
-        menubar.add_cascade(label="Tools", menu=tools_menu)
+        # Tools menu; its items depend on settings, so they are filled in
+        # each time the menu is opened
+        self.tools_menu = Menu(menubar, tearoff=0, postcommand=self._refresh_tools_menu)
+        menubar.add_cascade(label="Tools", menu=self.tools_menu)
         
         # Help menu
         help_menu = Menu(menubar, tearoff=0)
@@ -91,14 +171,34 @@ class MainApplication:
         
         self.root.config(menu=menubar)
     
+    def _refresh_tools_menu(self):
+        """Rebuild the Tools menu from the current settings"""
+        tools_menu = self.tools_menu
+        tools_menu.delete(0, "end")
+        tools_menu.add_command(label="Clear Conversation", command=self.clear_conversation)
+        
+        if self._db_enabled:
+            tools_menu.add_command(label="Database Statistics", command=self.show_db_stats)
+            tools_menu.add_command(label="Clean Database Cache", command=self.clean_database)
+    
     def extend_app(self):
         """Extend the QueryAssistantApp with additional features"""
         # Keep a reference to the original get_response method
         original_get_response = self.app.get_response
         
+        # Bindings that stay fixed for the app's lifetime, looked up once here
+        # instead of on every query. db_manager and _db_enabled are replaced
+        # when settings change, so they are read once per call instead.
+        app = self.app
+        entry = app.entry
+        add_user_message = app.add_user_message
+        add_assistant_message = app.add_assistant_message
+        status_var = app.status_var
+        cache_answer = self._cache_answer
+        
         # Override with our extended version that uses the database
         def extended_get_response():
-            query = self.app.entry.get().strip()
+            query = entry.get().strip()
             if not query:
                 messagebox.showinfo("Info", "Please enter a question")
                 return
@@ -107,71 +207,50 @@ class MainApplication:
                 messagebox.showwarning("Warning", "Question is too long (max 500 characters)")
                 return
             
+            # Fall through to the API if the database is still opening
+            self._db_ready.wait(timeout=0.05)
+            db = self.db_manager if self._db_enabled else None
+            
             # Check database cache if enabled
             cached_answer = None
-            if self.db_manager and self.config_manager.get("database", "enabled"):
-                cached_answer = self.db_manager.get_cached_answer(query)
+            if db:
+                cached_answer = db.get_cached_answer(query)
             
             if cached_answer:
                 # Display cached answer
-                self.app.add_user_message(query)
-                self.app.add_assistant_message(cached_answer + "\n(Retrieved from cache)")
-                self.app.entry.delete(0, tk.END)
-                self.app.status_var.set("Answered from cache")
+                add_user_message(query)
+                add_assistant_message(cached_answer + "\n(Retrieved from cache)")
+                entry.delete(0, tk.END)
+                status_var.set("Answered from cache")
             else:
-                # No cached answer, use original method
-                original_get_response()
-                
-                # After getting a response, we'll cache it
-                # This is done in a background thread to avoid blocking UI
-                if self.db_manager and self.config_manager.get("database", "enabled"):
-                    # We need to find a way to access the latest response
-                    # For now, we'll use a hack to extract it from the text area
-                    def cache_latest_response():
-                        # Wait a bit for the response to be added to the text area
-                        self.root.after(1000, self._cache_latest_qa_pair, query)
-                    
-                    threading.Thread(target=cache_latest_response, daemon=True).start()
+                # No cached answer, use original method and cache the answer once it arrives
+                if db:
+                    original_get_response(on_answer=partial(cache_answer, query))
+                else:
+                    original_get_response()
         
         # Replace the method
         self.app.get_response = extended_get_response
     
-    def _cache_latest_qa_pair(self, query):
-        """Cache the latest Q&A pair from the text area"""
+    def _init_db(self, db_path):
+        """Open the database manager off the UI thread"""
+        try:
+            self.db_manager = DatabaseManager(db_path)
+        except Exception as e:
+            logger.error(f"Error opening database: {e}")
+        finally:
+            self._db_ready.set()
+    
+    def _cache_answer(self, query, answer):
+        """Cache a Q&A pair the server has just answered"""
         if not self.db_manager:
             return
             
         try:
-            # Get content from text area
-            self.app.text_area.config(state=tk.NORMAL)
-            content = self.app.text_area.get("1.0", tk.END)
-            self.app.text_area.config(state=tk.DISABLED)
-            
-            # Find the last assistant response
-            parts = content.split("Assistant: ")
-            if len(parts) > 1:
-                last_response = parts[-1].split("\n\n")[0].strip()
-                
-                # Cache the Q&A pair
-                if last_response and not "(Retrieved from cache)" in last_response:
-                    clean_response = last_response.replace("\n(Retrieved from cache)", "")
-                    self.db_manager.cache_qa_pair(query, clean_response)
+            self.db_manager.cache_qa_pair(query, answer)
         except Exception as e:
             logger.error(f"Error caching Q&A pair: {e}")
     
-    def start_background_tasks(self):
-        """Start background tasks"""
-        # Schedule database cleanup if enabled
-        if self.db_manager and self.config_manager.get("database", "enabled"):
-            # Clean database every 24 hours
-            def scheduled_db_cleanup():
-                self.db_manager.clean_old_entries()
-                # Schedule again after 24 hours
-                self.root.after(24 * 60 * 60 * 1000, scheduled_db_cleanup)
-            
-            # Start the first run after 1 hour
-            self.root.after(60 * 60 * 1000, scheduled_db_cleanup)
-    
     def open_settings(self):
         """Open settings dialog"""
         config_dialog = ConfigDialog(self.root, self.config_manager)
@@ -179,16 +258,31 @@ class MainApplication:
         # Update app with new settings if dialog is closed
         self.root.wait_window(config_dialog.dialog)
         
-        # Update API URL
-        self.app.api_url = self.config_manager.get("api", "url")
+        # Refresh the cached settings
+        self._db_enabled = bool(self.config_manager.get("database", "enabled"))
+        self._api_url = self.config_manager.get("api", "url")
+        
+        # Update API URL; the app ignores one it cannot parse and keeps the previous URL
+        self.app.api_url = self._api_url
+        if self.app.api_url != self._api_url:
+            messagebox.showerror("Settings", f"The API URL is not valid:\n{self._api_url}\n\nStill using {self.app.api_url}.")
+            self._api_url = self.app.api_url
+        
+        # Let a database still opening at startup finish before replacing it
+        self._db_ready.wait()
         
         # Restart database manager if settings changed
-        if self.config_manager.get("database", "enabled"):
+        if self._db_enabled:
             db_path = self.config_manager.get("database", "path")
             if self.db_manager is None or self.db_manager.db_path != db_path:
                 if self.db_manager:
                     self.db_manager.close()
-                self.db_manager = DatabaseManager(db_path)
+                    self.db_manager = None
+                try:
+                    self.db_manager = DatabaseManager(db_path)
+                except Exception as e:
+                    logger.error(f"Error opening database: {e}")
+                    messagebox.showerror("Database", f"Could not open the database:\n{str(e)}")
         else:
             if self.db_manager:
                 self.db_manager.close()
@@ -200,6 +294,7 @@ class MainApplication:
     
     def show_db_stats(self):
         """Show database statistics"""
+        self._db_ready.wait()
         if not self.db_manager:
             messagebox.showinfo("Database", "Database is not enabled")
             return
@@ -221,6 +316,7 @@ class MainApplication:
     
     def clean_database(self):
         """Clean the database cache"""
+        self._db_ready.wait()
         if not self.db_manager:
             messagebox.showinfo("Database", "Database is not enabled")
             return
@@ -231,44 +327,76 @@ class MainApplication:
     
     def check_api_status(self):
         """Check API status"""
-        api_url = self.config_manager.get("api", "url")
+        # A check is already running; its result will be shown
+        if self._status_future and not self._status_future.done():
+            return
+        
+        api_url = self._api_url
         
-        # Show checking message
+        # Show checking message; Tk repaints it on the next idle cycle
         self.app.status_var.set("Checking API status...")
-        self.root.update_idletasks()
         
-        # Check in a separate thread
+        def probe_health():
+            return SESSION.get(f"{api_url}/health", timeout=5)
+        
+        def probe_query():
+            return SESSION.post(f"{api_url}/query", json={"question": "test"}, timeout=5)
+        
+        # Check on the worker thread. /health is tried first; /query counts
+        # against the rate limit and may call the model, so it is only
+        # probed once /health has failed or not answered within the grace
+        # period, and then whichever succeeds first wins
         def check_api():
-            try:
-                # Try health endpoint first
-                health_url = f"{api_url}/health"
-                try:
-                    response = requests.get(health_url, timeout=5)
-                    if response.status_code == 200:
-                        self.root.after(0, lambda: self.app.status_var.set("API is online and healthy"))
-                        self.root.after(0, lambda: messagebox.showinfo("API Status", "The API server is online and responding normally."))
+            health = self._probe_executor.submit(probe_health)
+            done, _ = wait([health], timeout=_HEALTH_GRACE)
+            if done and health.exception() is None and health.result().status_code == 200:
+                self._post_status("API is online and healthy", (messagebox.showinfo, "API Status", "The API server is online and responding normally."))
+                return
+            
+            query = self._probe_executor.submit(probe_query)
+            pending = {health, query}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None and future.result().status_code == 200:
+                        if future is health:
+                            self._post_status("API is online and healthy", (messagebox.showinfo, "API Status", "The API server is online and responding normally."))
+                        else:
+                            self._post_status("API is online", (messagebox.showinfo, "API Status", "The API server is online and responding."))
                         return
-                except:
-                    pass
-                
-                # Try query endpoint as fallback
-                response = requests.post(
-                    f"{api_url}/query", 
-                    json={"question": "test"}, 
-                    timeout=5
-                )
-                
-                if response.status_code == 200:
-                    self.root.after(0, lambda: self.app.status_var.set("API is online"))
-                    self.root.after(0, lambda: messagebox.showinfo("API Status", "The API server is online and responding."))
-                else:
-                    self.root.after(0, lambda: self.app.status_var.set(f"API error: {response.status_code}"))
-                    self.root.after(0, lambda: messagebox.showwarning("API Status", f"The API server returned an error code: {response.status_code}"))
+            
+            # Neither probe succeeded; report what /query said
+            try:
+                response = query.result()
             except Exception as e:
-                self.root.after(0, lambda: self.app.status_var.set("API connection failed"))
-                self.root.after(0, lambda: messagebox.showerror("API Status", f"Could not connect to the API server:\n{str(e)}\n\nMake sure the backend is running (python backend_api.py)."))
+                self._post_status("API connection failed", (messagebox.showerror, "API Status", f"Could not connect to the API server:\n{str(e)}\n\nMake sure the backend is running (python backend_api.py)."))
+            else:
+                self._post_status(f"API error: {response.status_code}", (messagebox.showwarning, "API Status", f"The API server returned an error code: {response.status_code}"))
         
-        threading.Thread(target=check_api, daemon=True).start()
+        self._status_future = self._status_executor.submit(check_api)
+    
+    def _post_status(self, msg, box=None):
+        """Show a status message, and optionally a (show, title, text) message box, from any thread
+        
+        Each call schedules a single Tk callback; a status identical to one
+        still waiting to be shown is dropped.
+        """
+        status = (msg, box)
+        if status == self._pending_status:
+            return
+        self._pending_status = status
+        self.root.after(0, self._apply_status, status)
+    
+    def _apply_status(self, status):
+        """Show a status posted by _post_status"""
+        if status == self._pending_status:
+            self._pending_status = None
+        
+        msg, box = status
+        self.app.status_var.set(msg)
+        if box:
+            show, title, text = box
+            show(title, text)
     
     def show_user_guide(self):
         """Show user guide"""
@@ -298,48 +426,7 @@ class MainApplication:
         scrollbar.config(command=text.yview)
         
         # Add content
-        guide_content = """
-        # AI Student Query Assistant - User Guide
-        
-        Welcome to the AI Student Query Assistant! This application helps students get quick answers to their questions.
-        
-        ## Getting Started
-        
-        1. Make sure the backend API is running (python backend_api.py)
-        2. Type your question in the input field
-        3. Press Enter or click Send to get an answer
-        
-        ## Features
-        
-        - **Instant Answers**: Get answers to common student questions
-        - **Database Cache**: Frequently asked questions are cached for faster responses
-        - **Conversation History**: Review your question history within the session
-        
-        ## Tips
-        
-        - Keep questions clear and concise
-        - For best results, ask one question at a time
-        - If the API is not responding, check the backend status
-        
-        ## Troubleshooting
-        
-        - If the application displays "Not Connected", make sure the backend API is running
-        - Check the API status from the Help menu
-        - If you encounter errors, try clearing the conversation
-        
-        ## Settings
-        
-        Access the settings from the File menu to configure:
-        - API connection details
-        - Database cache options
-        - UI preferences
-        
-        ## Support
-        
-        For support or to report issues, please contact the system administrator.
-        """
-        
-        text.insert(tk.END, guide_content)
+        text.insert(tk.END, _USER_GUIDE_TEXT)
         text.config(state=tk.DISABLED)
         
         # Close button
@@ -348,26 +435,15 @@ class MainApplication:
     
     def show_about(self):
         """Show about dialog"""
-        about_text = """
-        AI Student Query Assistant
-        Version 1.0
-        
-        A smart assistant for answering student questions.
-        
-        Features:
-        - AI-powered responses
-        - Database caching for faster replies
-        - User-friendly interface
-        
-        Created with ❤️ for students
-        """
-        
-        messagebox.showinfo("About", about_text)
+        messagebox.showinfo("About", _ABOUT_TEXT)
     
     def on_exit(self):
         """Handle application exit"""
         if messagebox.askyesno("Exit", "Are you sure you want to exit?"):
             # Clean up resources
+            self._status_executor.shutdown(wait=False)
+            self._probe_executor.shutdown(wait=False)
+            self._db_ready.wait()
             if self.db_manager:
                 self.db_manager.close()
             
@@ -375,8 +451,9 @@ class MainApplication:
             window_size = f"{self.root.winfo_width()}x{self.root.winfo_height()}"
             self.config_manager.set("ui", "window_size", window_size)
             
-            # Exit
+            # Exit, writing out any queued log records first
             self.root.destroy()
+            _log_listener.stop()
             sys.exit(0)
 
 if __name__ == "__main__":
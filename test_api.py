@@ -1,16 +1,27 @@
-import google.generativeai as genai
+import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Configure Google Gemini API with your API key
 API_KEY = os.environ.get("GEMINI_API_KEY")
-if not API_KEY:
-    print("Error: GEMINI_API_KEY not found in environment variables")
-    sys.exit(1)genai.configure(api_key=API_KEY)
+
+def probe_model(genai, model_name):
+    """Ask a model a test question, returning its text response or None"""
+    model = genai.GenerativeModel(model_name)
+    response = model.generate_content("Hello, what's the capital of France?")
+    
+    if hasattr(response, "text"):
+        return response.text
+    return None
 
 def test_api_connection():
     """Test if the Google Generative AI API is working properly"""
     print("Testing Google Generative AI API connection...")
     
+    # Imported here because google.generativeai pulls in grpc and protobuf
+    import google.generativeai as genai
+    genai.configure(api_key=API_KEY)
+    
     # List all available models to see what's available
     try:
         print("\nListing available models:")
@@ -21,30 +32,39 @@ def test_api_connection():
         print(f"Error listing models: {e}")
         return False
     
-    # Try to use the model
+    # Try the models in parallel and stop at the first one that answers
     try:
-        print("\nTesting model response:")
-        # Try with gemini-1.5-pro first
+        print("\nTesting model responses:")
         model_names = [
             "gemini-1.5-pro", 
             "gemini-pro", 
             "gemini-pro-vision"
         ]
         
-        for model_name in model_names:
-            print(f"\nTrying model: {model_name}")
-            try:
-                model = genai.GenerativeModel(model_name)
-                response = model.generate_content("Hello, what's the capital of France?")
+        executor = ThreadPoolExecutor(max_workers=len(model_names))
+        try:
+            futures = {executor.submit(probe_model, genai, model_name): model_name for model_name in model_names}
+            
+            for future in as_completed(futures):
+                model_name = futures[future]
+                try:
+                    text = future.result()
+                except Exception as model_error:
+                    print(f"Error with model {model_name}: {model_error}")
+                    continue
                 
-                if hasattr(response, "text"):
-                    print(f"Response received: {response.text[:100]}...")
+                if text:
+                    print(f"Response received: {text[:100]}...")
                     print(f"SUCCESS: Model {model_name} works!")
                     return True
                 else:
                     print(f"Model {model_name} didn't return a text response.")
-            except Exception as model_error:
-                print(f"Error with model {model_name}: {model_error}")
+        finally:
+            # Drop probes that have not started and return without waiting for
+            # the running ones (they still finish before the interpreter exits)
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
         
         print("ERROR: None of the tested models worked.")
         return False
@@ -54,6 +74,10 @@ def test_api_connection():
         return False
 
 if __name__ == "__main__":
+    if not API_KEY:
+        print("Error: GEMINI_API_KEY not found in environment variables")
+        sys.exit(1)
+    
     success = test_api_connection()
     if success:
         print("\nAPI TEST SUCCESSFUL: The Google Generative AI API is working correctly!")
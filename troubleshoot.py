@@ -1,10 +1,23 @@
 import sys
 import os
+import importlib.util
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import time
 import subprocess
 
+# Shared HTTP session so the connection and query checks reuse one connection.
+# Retries give a backend that is still starting a moment to accept the connection;
+# raise_on_status=False returns the last 502/503/504 response instead of raising.
+SESSION = requests.Session()
+SESSION.mount("http://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=[502, 503, 504], raise_on_status=False)
+))
+
 def check_python_version():
     """Check if Python version is compatible"""
     print("\n--- Checking Python Version ---")
@@ -17,22 +30,41 @@ def check_python_version():
         print("✅ Python version is compatible")
         return True
 
+def check_sqlite_version():
+    """Check if the SQLite library supports the answer cache"""
+    print("\n--- Checking SQLite Version ---")
+    import sqlite3
+    print(f"SQLite version: {sqlite3.sqlite_version}")
+    if sqlite3.sqlite_version_info < (3, 31, 0):
+        print("⚠️ WARNING: SQLite 3.31 or higher is required for the answer cache; caching will be disabled")
+        return False
+    else:
+        print("✅ SQLite version is compatible")
+        return True
+
 def check_required_packages():
     """Check if required packages are installed"""
     print("\n--- Checking Required Packages ---")
-    required_packages = [
-        "flask", 
-        "flask-cors", 
-        "google-generativeai", 
-        "requests"
-    ]
+    # pip package name -> module it installs
+    required_packages = {
+        "flask": "flask", 
+        "flask-cors": "flask_cors", 
+        "google-generativeai": "google.generativeai", 
+        "requests": "requests"
+    }
     
     all_installed = True
-    for package in required_packages:
+    for package, module in required_packages.items():
+        # find_spec only locates the module, without running its import-time code
         try:
-            __import__(package.replace("-", "_"))
-            print(f"✅ {package} is installed")
+            installed = importlib.util.find_spec(module) is not None
         except ImportError:
+            # The parent package of a dotted module is missing
+            installed = False
+        
+        if installed:
+            print(f"✅ {package} is installed")
+        else:
             print(f"❌ {package} is NOT installed")
             all_installed = False
     
@@ -42,13 +74,13 @@ def check_api_connection():
     """Check if backend API is running"""
     print("\n--- Checking Backend API Connection ---")
     try:
-        response = requests.get("http://127.0.0.1:5000/", timeout=5)
+        response = SESSION.get("http://127.0.0.1:5000/", timeout=5)
         print(f"❌ Response received but unexpected: Status code {response.status_code}")
         return False
     except requests.ConnectionError:
         try:
             # Try a simple POST request
-            test_response = requests.post(
+            test_response = SESSION.post(
                 "http://127.0.0.1:5000/query",
                 json={"question": "test"},
                 timeout=5
@@ -75,7 +107,7 @@ def test_simple_query():
     """Test a simple query to the backend"""
     print("\n--- Testing Query Functionality ---")
     try:
-        response = requests.post(
+        response = SESSION.post(
             "http://127.0.0.1:5000/query",
             json={"question": "hello"},
             timeout=10
@@ -114,13 +146,23 @@ def start_backend():
             text=True
         )
         
-        # Wait a bit for the server to start
-        print("Waiting for backend to start (5 seconds)...")
-        time.sleep(5)
+        # Poll the health endpoint about every 100 ms for up to 5 seconds instead
+        # of always waiting that long. A plain requests.get has no retries, so a
+        # refused connection fails at once rather than backing off like SESSION.
+        print("Waiting for backend to start (up to 5 seconds)...")
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and process.poll() is None:
+            try:
+                if requests.get("http://127.0.0.1:5000/health", timeout=0.2).status_code == 200:
+                    print("✅ Backend API started successfully")
+                    return True, process
+            except requests.RequestException:
+                pass
+            time.sleep(0.1)
         
         # Check if process is still running
         if process.poll() is None:
-            print("✅ Backend API started successfully")
+            print("✅ Backend API started (not answering health checks yet)")
             return True, process
         else:
             stdout, stderr = process.communicate()
@@ -142,6 +184,9 @@ def main():
         print("\n❌ Please upgrade your Python installation.")
         return
     
+    # The cache is optional, so an old SQLite is only reported
+    check_sqlite_version()
+    
     # Check required packages
     packages_ok = check_required_packages()
     if not packages_ok:
@@ -153,32 +198,33 @@ def main():
     backend_running = check_api_connection()
     backend_process = None
     
-    # If backend is not running, try to start it
-    if not backend_running:
-        print("\nBackend API is not running. Attempting to start it...")
-        backend_ok, backend_process = start_backend()
-        if backend_ok:
-            # Recheck API connection
-            backend_running = check_api_connection()
-    
-    # Test a simple query if backend is running
-    if backend_running:
-        query_ok = test_simple_query()
-        if query_ok:
-            print("\n✅ The system appears to be working correctly!")
-            print("   You can now start the frontend application:")
-            print("   python ai_student_query_assistant.py")
+    try:
+        # If backend is not running, try to start it
+        if not backend_running:
+            print("\nBackend API is not running. Attempting to start it...")
+            backend_ok, backend_process = start_backend()
+            if backend_ok:
+                # Recheck API connection
+                backend_running = check_api_connection()
+        
+        # Test a simple query if backend is running
+        if backend_running:
+            query_ok = test_simple_query()
+            if query_ok:
+                print("\n✅ The system appears to be working correctly!")
+                print("   You can now start the frontend application:")
+                print("   python ai_student_query_assistant.py")
+            else:
+                print("\n❌ The backend is running but query functionality failed.")
+                print("   Check api.log for more detailed error information.")
         else:
-            print("\n❌ The backend is running but query functionality failed.")
-            print("   Check api.log for more detailed error information.")
-    else:
-        print("\n❌ Could not establish connection to the backend API.")
-        print("   Please check api.log for error details.")
-    
-    # Clean up if we started the backend
-    if backend_process and backend_process.poll() is None:
-        print("\nClosing backend process...")
-        backend_process.terminate()
+            print("\n❌ Could not establish connection to the backend API.")
+            print("   Please check api.log for error details.")
+    finally:
+        # Clean up if we started the backend, also when interrupted with Ctrl+C
+        if backend_process and backend_process.poll() is None:
+            print("\nClosing backend process...")
+            backend_process.terminate()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file